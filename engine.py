@@ -1,147 +1,282 @@
+import errno
 import json
 import os
+import secrets
 import shutil
-import datetime
+import functools
+import stat
+import threading
+import time
+from dataclasses import dataclass, field
 from pathlib import Path
 
 CONFIG_PATH = Path(__file__).parent / "config.json"
 
+# Creation times are bucketed before the year lookup so clustered files share
+# a cache entry. Every UTC offset is a multiple of 15 minutes, so a bucket
+# never straddles a local New Year.
+_CTIME_BUCKET_SECONDS = 900
+
+_COLLISION_RETRIES = 3
+
+_claim_lock = threading.Lock()
+
+# Shared with callers that print progress from worker threads, so their lines
+# and safe_move's warnings never interleave
+print_lock = threading.Lock()
+_claimed: set[Path] = set()
+
+_dev_cache: dict[Path, int] = {}
+
+
+@dataclass(slots=True, frozen=True)
+class CompiledRule:
+    category: str
+    min_gb: float | None
+    max_gb: float | None
+    year: bool
+    file_type: int
+    dest_dir: Path | None
+    groups: dict[str, str]
+
+
+@dataclass(slots=True)
+class CompiledRouting:
+    ext_index: dict[str, tuple[CompiledRule, ...]]
+    wildcards: tuple[CompiledRule, ...]
+    rules: dict[str, CompiledRule]
+    # (custom root, category, year, subfolder) -> destination folder
+    dest_cache: dict[tuple, Path] = field(default_factory=dict)
+
 
 def load_config(path: str | Path | None = None) -> dict:
     p = Path(path) if path else CONFIG_PATH
     with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+        config = json.load(f)
+    config["_compiled"] = compile_routing(config["routing"])
+    return config
+
+
+def compile_routing(routing: dict) -> CompiledRouting:
+    rules: dict[str, CompiledRule] = {}
+    matchable: list[tuple[CompiledRule, frozenset[str]]] = []
+
+    for category, raw in routing.items():
+        extensions_raw = raw.get("extensions", [])
+        extensions: frozenset[str] = frozenset()
+        groups: dict[str, str] = {}
+
+        if isinstance(extensions_raw, dict):
+            for group_name, exts in extensions_raw.items():
+                for ext in exts:
+                    groups.setdefault(ext.lower(), group_name)
+            extensions = frozenset(groups)
+        elif isinstance(extensions_raw, (list, tuple, set, frozenset)):
+            extensions = frozenset(e.lower() for e in extensions_raw)
+
+        rule = CompiledRule(
+            category=category,
+            min_gb=raw.get("min_gb"),
+            max_gb=raw.get("max_gb"),
+            year=raw.get("year", False),
+            file_type=raw.get("file_type", 0),
+            # A missing path only matters once a file is routed here
+            dest_dir=Path(raw["path"]) if raw.get("path") is not None else None,
+            groups=groups,
+        )
+        rules[category] = rule
+
+        if category in ("Others", "Folders"):
+            continue
+        matchable.append((rule, extensions))
+
+    # Categories without extensions accept any file, so they are merged into
+    # every extension bucket at their original position to keep config order.
+    wildcards = tuple(rule for rule, exts in matchable if not exts)
+    all_exts = {ext for _rule, exts in matchable for ext in exts}
+    ext_index = {
+        ext: tuple(rule for rule, exts in matchable if not exts or ext in exts)
+        for ext in all_exts
+    }
 
+    return CompiledRouting(ext_index=ext_index, wildcards=wildcards, rules=rules)
 
-def get_file_metadata(filepath: str | Path) -> dict:
-    p = Path(filepath)
-    stat = p.stat()
-    size_gb = stat.st_size / (1024 ** 3)
 
+def get_compiled(config: dict) -> CompiledRouting:
+    compiled = config.get("_compiled")
+    if compiled is None:
+        compiled = config["_compiled"] = compile_routing(config["routing"])
+    return compiled
+
+
+@functools.lru_cache(maxsize=4096)
+def _year_from_ctime(ctime_bucket: int) -> int:
+    return time.localtime(ctime_bucket * _CTIME_BUCKET_SECONDS).tm_year
+
+
+def _creation_year(st: os.stat_result) -> int:
     try:
-        ctime = stat.st_birthtime
+        ctime = st.st_birthtime
     except AttributeError:
-        ctime = stat.st_ctime
+        ctime = st.st_ctime
+    return _year_from_ctime(int(ctime // _CTIME_BUCKET_SECONDS))
 
-    year = datetime.datetime.fromtimestamp(ctime).year
+
+def get_file_metadata(filepath: str | Path, st: os.stat_result | None = None) -> dict:
+    p = filepath if isinstance(filepath, Path) else Path(filepath)
+    if st is None:
+        st = os.stat(p)
 
     return {
         "extension": p.suffix.lower(),
-        "size_gb": size_gb,
-        "year": year,
+        "size_gb": st.st_size / (1024 ** 3),
+        "year": _creation_year(st),
     }
 
 
-def match_category(metadata: dict, routing: dict) -> str:
-    for category, rules in routing.items():
-        if category in ("Others", "Folders"):
+def _match(extension: str, size_gb: float, compiled: CompiledRouting) -> str:
+    for rule in compiled.ext_index.get(extension, compiled.wildcards):
+        if rule.min_gb is not None and size_gb < rule.min_gb:
             continue
-
-        if not _rule_matches(metadata, rules):
+        if rule.max_gb is not None and size_gb > rule.max_gb:
             continue
-
-        return category
+        return rule.category
 
     return "Others"
 
 
-def _rule_matches(metadata: dict, rules: dict) -> bool:
-    extensions_raw = rules.get("extensions", [])
-    extensions = []
-    
-    if isinstance(extensions_raw, dict):
-        for exts in extensions_raw.values():
-            extensions.extend(exts)
-    elif isinstance(extensions_raw, list):
-        extensions = extensions_raw
+def match_category(metadata: dict, compiled: CompiledRouting) -> str:
+    return _match(metadata["extension"], metadata["size_gb"], compiled)
+
+
+def classify(filepath: Path, st: os.stat_result, compiled: CompiledRouting,
+             dest_root: Path | None = None) -> tuple[str, Path]:
+    # With dest_root (custom target / in-place sorting) the category folder is
+    # placed under it instead of at the routing path
+    extension = filepath.suffix.lower()
+    category = _match(extension, st.st_size / (1024 ** 3), compiled)
+    rule = compiled.rules.get(category)
+    if rule is None:
+        if dest_root is None:
+            raise KeyError(f"No '{category}' category defined in config.json")
+        return category, dest_root / category
+    if dest_root is None and rule.dest_dir is None:
+        raise KeyError(f"No 'path' defined for category '{category}' in config.json")
+
+    # If the routing rule specifies year=True, create a subfolder for the year
+    year = _creation_year(st) if rule.year else None
+
+    # Determine file grouping based on file_type parameter (0, 1, or 2)
+    # 1: Extension-based subfolder
+    if rule.file_type == 1:
+        ext = extension.lstrip(".")
+        subfolder = ext.upper() if ext else "UNKNOWN"
+
+    # 2: Semantic Grouping subfolder
+    elif rule.file_type == 2:
+        subfolder = rule.groups.get(extension, "Other Types")
+
+    else:
+        subfolder = None
+
+    key = (dest_root, category, year, subfolder)
+    dest_dir = compiled.dest_cache.get(key)
+    if dest_dir is None:
+        dest_dir = rule.dest_dir if dest_root is None else dest_root / category
+        if year is not None:
+            dest_dir = dest_dir / str(year)
+        if subfolder is not None:
+            dest_dir = dest_dir / subfolder
+        compiled.dest_cache[key] = dest_dir
+
+    return category, dest_dir
 
-    if extensions:
-        if metadata["extension"] not in extensions:
-            return False
 
-    year = rules.get("year", False)
-    # We no longer filter by year matching. 
-    # If year is True, it will be used in sort_file to create a subfolder.
+def _is_free(dest: Path) -> bool:
+    return dest not in _claimed and not dest.exists()
+
+
+def _unique_dest(src: Path, dest_dir: Path) -> Path:
+    dest = dest_dir / src.name
+    if _is_free(dest):
+        return dest
+
+    stem = src.stem
+    suffix = src.suffix
+    dest = dest_dir / f"{stem}_{int(time.time() * 1000):x}{suffix}"
+    if _is_free(dest):
+        return dest
+    for _ in range(_COLLISION_RETRIES):
+        dest = dest_dir / f"{stem}_{secrets.token_hex(3)}{suffix}"
+        if _is_free(dest):
+            return dest
 
-    min_gb = rules.get("min_gb")
-    if min_gb is not None:
-        if metadata["size_gb"] < min_gb:
-            return False
+    raise FileExistsError(f"Could not find a free name for {src.name} in {dest_dir}")
 
-    max_gb = rules.get("max_gb")
-    if max_gb is not None:
-        if metadata["size_gb"] > max_gb:
-            return False
 
-    return True
+def _device_of(dest_dir: Path) -> int:
+    dev = _dev_cache.get(dest_dir)
+    if dev is None:
+        dev = _dev_cache[dest_dir] = os.stat(dest_dir).st_dev
+    return dev
 
 
-def safe_move(src: str | Path, dest_dir: str | Path) -> Path | None:
+def safe_move(src: str | Path, dest_dir: str | Path, st: os.stat_result | None = None) -> Path | None:
     src = Path(src)
     dest_dir = Path(dest_dir)
-    dest_dir.mkdir(parents=True, exist_ok=True)
 
-    dest = dest_dir / src.name
+    # Already where the routing wants it (the common case on a repeated
+    # sync): no mkdir, no probing, no move.
+    if dest_dir / src.name == src:
+        return src
+
+    dest_dir.mkdir(parents=True, exist_ok=True)
 
-    if dest.exists():
-        stem = src.stem
-        suffix = src.suffix
-        counter = 1
-        while True:
-            new_name = f"{stem}_{counter}{suffix}"
-            dest = dest_dir / new_name
-            if not dest.exists():
-                break
-            counter += 1
+    # Names are claimed under a lock so concurrent moves of same-named files
+    # into one folder cannot pick the same destination and overwrite each other.
+    with _claim_lock:
+        dest = _unique_dest(src, dest_dir)
+        _claimed.add(dest)
 
     try:
-        shutil.move(str(src), str(dest))
+        # Same filesystem: a plain rename, skipping shutil.move's extra probing.
+        # DirEntry stats on Windows report st_dev 0, so the rename is simply
+        # attempted there.
+        if st is not None and (st.st_dev == 0 or st.st_dev == _device_of(dest_dir)):
+            try:
+                os.rename(src, dest)
+            except OSError as exc:
+                # Bind mounts share st_dev but rename(2) across them fails
+                if exc.errno != errno.EXDEV:
+                    raise
+                shutil.move(str(src), str(dest))
+        else:
+            shutil.move(str(src), str(dest))
         return dest
     except PermissionError:
-        print(f"⚠️ Skipped locked file: {src.name}")
+        with print_lock:
+            print(f"⚠️ Skipped locked file: {src.name}")
         return None
+    finally:
+        with _claim_lock:
+            _claimed.discard(dest)
 
 
-def sort_file(filepath: str | Path, config: dict, base_dir: str | Path | None = None) -> tuple[str, Path | None]:
+def sort_file(filepath: str | Path, config: dict, base_dir: str | Path | None = None,
+              st: os.stat_result | None = None) -> tuple[str, Path | None]:
     filepath = Path(filepath)
-    if not filepath.is_file():
+    if st is None:
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            pass
+    if st is None or not stat.S_ISREG(st.st_mode):
         raise ValueError(f"Not a file: {filepath}")
 
-    metadata = get_file_metadata(filepath)
-    routing = config["routing"]
-    category = match_category(metadata, routing)
-    dest_dir = Path(routing[category]["path"])
-    
-    # If the routing rule specifies year=True, create a subfolder for the year
-    use_year_subfolder = routing[category].get("year", False)
-    if use_year_subfolder:
-        dest_dir = dest_dir / str(metadata["year"])
-
-    # Determine file grouping based on file_type parameter (0, 1, or 2)
-    file_type_setting = routing[category].get("file_type", 0)
-    
-    # 1: Extension-based subfolder
-    if file_type_setting == 1:
-        ext = metadata["extension"].lstrip(".")
-        ext_folder = ext.upper() if ext else "UNKNOWN"
-        dest_dir = dest_dir / ext_folder
-        
-    # 2: Semantic Grouping subfolder
-    elif file_type_setting == 2:
-        ext = metadata["extension"]
-        file_groups = routing[category].get("extensions", {})
-        group_folder = "Other Types"  # Default fallback
-        
-        if isinstance(file_groups, dict):
-            for group_name, exts in file_groups.items():
-                if ext in exts:
-                    group_folder = group_name
-                    break
-                
-        dest_dir = dest_dir / group_folder
+    category, dest_dir = classify(filepath, st, get_compiled(config))
     if base_dir and not dest_dir.is_absolute():
         dest_dir = Path(base_dir) / dest_dir
-    final = safe_move(filepath, dest_dir)
+    final = safe_move(filepath, dest_dir, st)
     return category, final
 
 
@@ -159,13 +294,7 @@ def sort_folder(folderpath: str | Path, config: dict, base_dir: str | Path | Non
     # If the routing rule specifies year=True, create a subfolder for the year
     use_year_subfolder = routing["Folders"].get("year", False)
     if use_year_subfolder:
-        stat = folderpath.stat()
-        try:
-            ctime = stat.st_birthtime
-        except AttributeError:
-            ctime = stat.st_ctime
-        year = datetime.datetime.fromtimestamp(ctime).year
-        dest_dir = dest_dir / str(year)
+        dest_dir = dest_dir / str(_creation_year(os.stat(folderpath)))
 
     if base_dir and not dest_dir.is_absolute():
         dest_dir = Path(base_dir) / dest_dir
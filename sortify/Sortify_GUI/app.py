@@ -1,34 +1,61 @@
 import os
 import sys
 import eel
+from collections.abc import Iterator
 from pathlib import Path
 
 # Add the parent directory of 'sortify' to sys.path to import engine
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 
-from engine import load_config, sort_file, sort_folder, safe_move, get_file_metadata, match_category
+from engine import load_config, sort_file, sort_folder, safe_move, classify, get_compiled
 
 # Set web files folder
 eel.init('UI')
 
 DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config.json"
 
-def _collect_all_files(directory: Path) -> list[Path]:
-    files = []
-    for root, _dirs, filenames in os.walk(directory):
-        for fn in filenames:
-            files.append(Path(root) / fn)
-    return files
-
-def _remove_empty_dirs(directory: Path) -> None:
-    for root, dirs, _files in os.walk(str(directory), topdown=False):
-        for d in dirs:
-            dp = Path(root) / d
-            try:
-                if not any(dp.iterdir()):
-                    dp.rmdir()
-            except OSError:
-                pass
+def _iter_files(directory: str | Path) -> Iterator[os.DirEntry]:
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    yield from _iter_files(entry.path)
+            else:
+                yield entry
+
+def _list_dir(directory: str | Path) -> list[os.DirEntry]:
+    with os.scandir(directory) as it:
+        return list(it)
+
+def _collect_all_files(directory: Path) -> list[os.DirEntry]:
+    return list(_iter_files(directory))
+
+def _entry_stat(entry: os.DirEntry) -> os.stat_result | None:
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+def _remove_empty_dirs(directory: str | Path) -> None:
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        return
+    with it:
+        subdirs = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    for d in subdirs:
+        _remove_empty_dirs(d)
+        try:
+            os.rmdir(d)
+        except OSError:
+            pass
+
+def _is_within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
 
 def _is_folders_category(name: str) -> bool:
     return name.lower() in ("folders", "folder")
@@ -44,44 +71,22 @@ def _collapse_year_subfolders(folders_dir: Path) -> None:
             except OSError:
                 pass
 
-def _sort_single_file(filepath: Path, config: dict, custom_target: Path | None, base_dir: Path | None = None) -> dict:
-    result = {"name": filepath.name, "success": False, "category": "Error", "dest": None, "error": None}
+def _sort_single_file(filepath: Path, config: dict, custom_target: Path | None, base_dir: Path | None = None,
+                      st: os.stat_result | None = None) -> dict:
+    result = {"name": filepath.name, "success": False, "moved": False, "category": "Error", "dest": None, "error": None}
     try:
         if custom_target:
-            metadata = get_file_metadata(filepath)
-            category = match_category(metadata, config["routing"])
-            dest_dir = custom_target / category
-            use_year_subfolder = config["routing"].get(category, {}).get("year", False)
-            if use_year_subfolder:
-                dest_dir = dest_dir / str(metadata["year"])
-
-            file_type_setting = config["routing"].get(category, {}).get("file_type", 0)
-            
-            if file_type_setting == 1:
-                ext = metadata["extension"].lstrip(".")
-                ext_folder = ext.upper() if ext else "UNKNOWN"
-                dest_dir = dest_dir / ext_folder
-                
-            elif file_type_setting == 2:
-                ext = metadata["extension"]
-                file_groups = config["routing"].get(category, {}).get("extensions", {})
-                group_folder = "Other Types"
-                
-                if isinstance(file_groups, dict):
-                    for group_name, exts in file_groups.items():
-                        if ext in exts:
-                            group_folder = group_name
-                            break
-                        
-                dest_dir = dest_dir / group_folder
-
-            dest = safe_move(filepath, dest_dir)
-            if dest:
-                result.update({"success": True, "category": category, "dest": str(dest)})
+            if st is None:
+                st = os.stat(filepath)
+            category, dest_dir = classify(filepath, st, get_compiled(config), custom_target)
+            dest = safe_move(filepath, dest_dir, st)
         else:
-            cat, dest = sort_file(filepath, config, base_dir=base_dir)
-            if dest:
-                result.update({"success": True, "category": cat, "dest": str(dest)})
+            category, dest = sort_file(filepath, config, base_dir=base_dir, st=st)
+        # safe_move hands back the source itself when the file is already in place
+        if dest == filepath:
+            result.update({"success": True, "action": "Already sorted", "category": category, "dest": str(dest)})
+        elif dest:
+            result.update({"success": True, "moved": True, "category": category, "dest": str(dest)})
     except Exception as exc:
         result["error"] = str(exc)
         
@@ -127,43 +132,42 @@ def api_sort(target_dir_str, mode, custom_target_str, flatten, smart_flatten=Tru
         revert_target = Path(custom_target_str)
         revert_target.mkdir(parents=True, exist_ok=True)
 
-    entries = sorted(target_dir.iterdir())
     moved_count = 0
     logs = []
     
     if mode == "revert":
         folders_cat = target_dir / "Folders"
-        if folders_cat.is_dir():
+        rev_p = revert_target.resolve()
+        rev_str = os.path.normcase(str(rev_p))
+        fcat_str = os.path.normcase(str(folders_cat.resolve())) if folders_cat.is_dir() else None
+        if fcat_str:
             for item in folders_cat.iterdir():
-                if item.resolve() == revert_target.resolve():
+                if item.resolve() == rev_p:
                     continue
                 try:
                     dest = safe_move(item, revert_target)
-                    if dest:
+                    if dest and dest != item:
                         logs.append({"name": item.name, "action": "Reverted Intact", "dest": str(dest), "success": True})
                         moved_count += 1
                 except Exception as exc:
                      logs.append({"name": item.name, "action": "Error", "error": str(exc), "success": False})
 
-        for root, dirs, filenames in os.walk(target_dir):
-            root_p = Path(root).resolve()
-            rev_p = revert_target.resolve()
+        for root, dirs, filenames in os.walk(target_dir.resolve()):
+            root_str = os.path.normcase(root)
             
-            if root_p == rev_p or rev_p in root_p.parents:
+            if _is_within(root_str, rev_str):
                 dirs.clear()
                 continue
                 
-            if folders_cat.is_dir():
-                fcat_p = folders_cat.resolve()
-                if root_p == fcat_p or fcat_p in root_p.parents:
-                    dirs.clear()
-                    continue
+            if fcat_str and _is_within(root_str, fcat_str):
+                dirs.clear()
+                continue
                     
             for fn in filenames:
                 f = Path(root) / fn
                 try:
                     dest = safe_move(f, revert_target)
-                    if dest:
+                    if dest and dest != f:
                         logs.append({"name": f.name, "action": "Reverted", "dest": str(dest), "success": True})
                         moved_count += 1
                 except Exception as exc:
@@ -172,13 +176,15 @@ def api_sort(target_dir_str, mode, custom_target_str, flatten, smart_flatten=Tru
         _remove_empty_dirs(target_dir)
         return {"message": f"Successfully reverted {moved_count} items.", "logs": logs, "moved_count": moved_count}
 
-    for entry in entries:
-        if entry.is_file():
-            res = _sort_single_file(entry, config, custom_target, target_dir)
-            if res["success"]:
+    # Snapshot the listing: sorting creates category folders inside target_dir
+    for dir_entry in _list_dir(target_dir):
+        entry = Path(dir_entry.path)
+        if dir_entry.is_file():
+            res = _sort_single_file(entry, config, custom_target, target_dir, _entry_stat(dir_entry))
+            if res["moved"]:
                 moved_count += 1
             logs.append(res)
-        elif entry.is_dir():
+        elif dir_entry.is_dir():
             if flatten:
                 if smart_flatten and _is_folders_category(entry.name):
                     # Smart Flatten: collapse year subfolders but keep original folders intact
@@ -188,51 +194,48 @@ def api_sort(target_dir_str, mode, custom_target_str, flatten, smart_flatten=Tru
                             if custom_target:
                                 dest_dir = custom_target / "Folders"
                                 dest = safe_move(item, dest_dir)
-                                if dest:
+                                if dest and dest != item:
                                     moved_count += 1
                                     logs.append({"name": item.name, "success": True, "category": "Folders", "dest": str(dest)})
                             else:
                                 try:
                                     cat, dest = sort_folder(item, config, base_dir=target_dir)
-                                    if dest:
+                                    if dest and dest != item:
                                         moved_count += 1
                                         logs.append({"name": item.name, "success": True, "category": cat, "dest": str(dest)})
                                 except Exception as e:
                                     logs.append({"name": item.name, "success": False, "category": "Error", "error": str(e)})
                         elif item.is_file():
                             res = _sort_single_file(item, config, custom_target, target_dir)
-                            if res["success"]:
+                            if res["moved"]:
                                 moved_count += 1
                             logs.append(res)
                 else:
                     # Regular flatten: extract all files
                     for f in _collect_all_files(entry):
-                        res = _sort_single_file(f, config, custom_target, target_dir)
-                        if res["success"]:
+                        res = _sort_single_file(Path(f.path), config, custom_target, target_dir, _entry_stat(f))
+                        if res["moved"]:
                             moved_count += 1
                         logs.append(res)
-                _remove_empty_dirs(entry)
-                try:
-                    if entry.exists() and not any(entry.iterdir()):
-                        entry.rmdir()
-                except OSError:
-                    pass
             else:
                 if custom_target:
                     dest_dir = custom_target / "Folders"
                     dest = safe_move(entry, dest_dir)
-                    if dest:
+                    if dest and dest != entry:
                         moved_count += 1
                         logs.append({"name": entry.name, "success": True, "category": "Folders", "dest": str(dest)})
                 else:
                     try:
                         cat, dest = sort_folder(entry, config, base_dir=target_dir)
-                        if dest:
+                        if dest and dest != entry:
                             moved_count += 1
                             logs.append({"name": entry.name, "success": True, "category": cat, "dest": str(dest)})
                     except Exception as e:
                         logs.append({"name": entry.name, "success": False, "category": "Error", "error": str(e)})
 
+    if flatten:
+        _remove_empty_dirs(target_dir)
+
     return {"message": f"Successfully moved {moved_count} items.", "logs": logs, "moved_count": moved_count}
 
 if __name__ == '__main__':
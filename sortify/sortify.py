@@ -1,33 +1,95 @@
 import argparse
+import itertools
 import os
 import sys
+from collections.abc import Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-from engine import load_config, sort_file, sort_folder, safe_move, get_file_metadata, match_category
+from engine import load_config, sort_file, sort_folder, safe_move, classify, get_compiled, print_lock
 
 DEFAULT_CONFIG = Path(__file__).resolve().parent / "config.json"
 
+MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
 
-def _collect_all_files(directory: Path) -> list[Path]:
-    files = []
-    for root, _dirs, filenames in os.walk(directory):
-        for fn in filenames:
-            files.append(Path(root) / fn)
-    return files
 
+def _print(msg: str) -> None:
+    with print_lock:
+        print(msg)
 
-def _remove_empty_dirs(directory: Path) -> None:
-    for root, dirs, _files in os.walk(str(directory), topdown=False):
-        for d in dirs:
-            dp = Path(root) / d
-            try:
-                if not any(dp.iterdir()):
-                    dp.rmdir()
-                    print(f"  🗑  Removed empty folder: {dp}")
-            except OSError:
-                pass
+
+def _run_parallel(func, items) -> int:
+    # Only a bounded number of tasks is queued at a time so a lazy `items`
+    # iterator is never materialised in full.
+    moved = 0
+    pending = set()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        try:
+            for item in items:
+                if len(pending) >= MAX_WORKERS * 4:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    moved += sum(future.result() for future in done)
+                pending.add(pool.submit(func, item))
+            for future in as_completed(pending):
+                moved += future.result()
+        except BaseException:
+            # On Ctrl+C only let the moves already running finish; queued
+            # ones are dropped instead of being drained by the pool's exit.
+            pool.shutdown(cancel_futures=True)
+            raise
+    return moved
+
+
+def _iter_files(directory: str | Path) -> Iterator[os.DirEntry]:
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    yield from _iter_files(entry.path)
+            else:
+                yield entry
+
+
+def _list_dir(directory: str | Path) -> list[os.DirEntry]:
+    with os.scandir(directory) as it:
+        return list(it)
+
+
+def _collect_all_files(directory: Path) -> list[os.DirEntry]:
+    return list(_iter_files(directory))
+
+
+def _entry_stat(entry: os.DirEntry) -> os.stat_result | None:
+    try:
+        return entry.stat()
+    except OSError:
+        return None
+
+
+def _remove_empty_dirs(directory: str | Path) -> None:
+    try:
+        it = os.scandir(directory)
+    except OSError:
+        return
+    with it:
+        subdirs = [entry.path for entry in it if entry.is_dir(follow_symlinks=False)]
+    for d in subdirs:
+        _remove_empty_dirs(d)
+        try:
+            os.rmdir(d)
+            print(f"  🗑  Removed empty folder: {d}")
+        except OSError:
+            pass
+
+
+def _is_within(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
 
 
 def _is_folders_category(name: str) -> bool:
@@ -39,7 +101,7 @@ def _collapse_year_subfolders(folders_dir: Path) -> None:
         if item.is_dir() and item.name.isdigit() and len(item.name) == 4:
             for child in list(item.iterdir()):
                 dest = safe_move(child, folders_dir)
-                if dest:
+                if dest and dest != child:
                     print(f"  📂 {child.name}  ←  collapsed from {item.name}/")
             try:
                 if item.exists() and not any(item.iterdir()):
@@ -86,46 +148,47 @@ def interactive_sort(target_dir: Path, config: dict) -> None:
 
     print("\n  ⏳  Processing…\n")
 
-    entries = sorted(target_dir.iterdir())
     moved = 0
     
     if choice == "3":
         # First, revert intact folders from the "Folders" category
         folders_cat = target_dir / "Folders"
-        if folders_cat.is_dir():
+        rev_p = revert_target.resolve()
+        rev_str = os.path.normcase(str(rev_p))
+        fcat_str = os.path.normcase(str(folders_cat.resolve())) if folders_cat.is_dir() else None
+        if fcat_str:
             for item in folders_cat.iterdir():
-                if item.resolve() == revert_target.resolve():
+                if item.resolve() == rev_p:
                     continue
                 try:
                     dest = safe_move(item, revert_target)
-                    if dest:
+                    if dest and dest != item:
                         print(f"  ⏪ {item.name}  →  [Reverted Intact] {dest}")
                         moved += 1
                 except Exception as exc:
                     print(f"  ⚠  Failed to revert {item.name}: {exc}")
 
         # Then, revert all individual files from the rest of the structure
-        for root, dirs, filenames in os.walk(target_dir):
-            root_p = Path(root).resolve()
-            rev_p = revert_target.resolve()
-            
+        # Walking the resolved root keeps every yielded root canonical, so the
+        # skip checks below are plain string prefix tests
+        for root, dirs, filenames in os.walk(target_dir.resolve()):
+            root_str = os.path.normcase(root)
+
             # Skip the destination folder to avoid recursion
-            if root_p == rev_p or rev_p in root_p.parents:
+            if _is_within(root_str, rev_str):
                 dirs.clear()
                 continue
                 
             # Skip the Folders category as it's already been processed above
-            if folders_cat.is_dir():
-                fcat_p = folders_cat.resolve()
-                if root_p == fcat_p or fcat_p in root_p.parents:
-                    dirs.clear()
-                    continue
+            if fcat_str and _is_within(root_str, fcat_str):
+                dirs.clear()
+                continue
                     
             for fn in filenames:
                 f = Path(root) / fn
                 try:
                     dest = safe_move(f, revert_target)
-                    if dest:
+                    if dest and dest != f:
                         print(f"  ⏪ {f.name}  →  [Reverted] {dest}")
                         moved += 1
                 except Exception as exc:
@@ -137,11 +200,16 @@ def interactive_sort(target_dir: Path, config: dict) -> None:
         input("  Press Enter to exit...")
         return
 
-    for entry in entries:
-        if entry.is_file():
-            moved += _sort_single_file(entry, config, custom_target, target_dir)
+    # Snapshot the listing: sorting creates category folders inside target_dir
+    entries = _list_dir(target_dir)
+    moved += _run_parallel(
+        lambda f: _sort_single_file(Path(f.path), config, custom_target, target_dir, _entry_stat(f)),
+        [dir_entry for dir_entry in entries if dir_entry.is_file()],
+    )
 
-        elif entry.is_dir():
+    for dir_entry in entries:
+        if dir_entry.is_dir():
+            entry = Path(dir_entry.path)
             if flatten:
                 if smart_flatten and _is_folders_category(entry.name):
                     # Smart Flatten: collapse year subfolders but keep original folders intact
@@ -151,87 +219,77 @@ def interactive_sort(target_dir: Path, config: dict) -> None:
                             if custom_target:
                                 dest_dir = custom_target / "Folders"
                                 dest = safe_move(item, dest_dir)
-                                if dest:
+                                if dest and dest != item:
                                     print(f"  📁 {item.name}  →  [Folders] {dest}")
                                     moved += 1
                             else:
                                 cat, dest = sort_folder(item, config, base_dir=target_dir)
-                                if dest:
+                                if dest and dest != item:
                                     print(f"  📁 {item.name}  →  [{cat}] {dest}")
                                     moved += 1
                         elif item.is_file():
                             moved += _sort_single_file(item, config, custom_target, target_dir)
                 else:
                     # Regular flatten: extract all files
-                    for f in _collect_all_files(entry):
-                        moved += _sort_single_file(f, config, custom_target, target_dir)
-                _remove_empty_dirs(entry)
-                try:
-                    if entry.exists() and not any(entry.iterdir()):
-                        entry.rmdir()
-                        print(f"  🗑  Removed empty folder: {entry}")
-                except OSError:
-                    pass
+                    moved += _run_parallel(
+                        lambda f: _sort_single_file(Path(f.path), config, custom_target, target_dir, _entry_stat(f)),
+                        _collect_all_files(entry),
+                    )
             else:
                 if custom_target:
                     dest_dir = custom_target / "Folders"
                     dest = safe_move(entry, dest_dir)
-                    if dest:
+                    if dest and dest != entry:
                         print(f"  📁 {entry.name}  →  [Folders] {dest}")
                         moved += 1
                 else:
                     cat, dest = sort_folder(entry, config, base_dir=target_dir)
-                    if dest:
+                    if dest and dest != entry:
                         print(f"  📁 {entry.name}  →  [{cat}] {dest}")
                         moved += 1
 
+    if flatten:
+        # One bottom-up pass clears every emptied subfolder, including the
+        # flattened entries themselves
+        _remove_empty_dirs(target_dir)
+
     print(f"\n  ✅  Done! {moved} item(s) routed.\n")
     input("  Press Enter to exit...")
 
 
-def _sort_single_file(filepath: Path, config: dict, custom_target: Path | None, base_dir: Path | None = None) -> int:
+def _sort_single_file(filepath: Path, config: dict, custom_target: Path | None, base_dir: Path | None = None,
+                      st: os.stat_result | None = None) -> int:
     try:
         if custom_target:
-            metadata = get_file_metadata(filepath)
-            category = match_category(metadata, config["routing"])
-            dest_dir = custom_target / category
-            use_year_subfolder = config["routing"].get(category, {}).get("year", False)
-            if use_year_subfolder:
-                dest_dir = dest_dir / str(metadata["year"])
-
-            file_type_setting = config["routing"].get(category, {}).get("file_type", 0)
-            
-            if file_type_setting == 1:
-                ext = metadata["extension"].lstrip(".")
-                ext_folder = ext.upper() if ext else "UNKNOWN"
-                dest_dir = dest_dir / ext_folder
-                
-            elif file_type_setting == 2:
-                ext = metadata["extension"]
-                file_groups = config["routing"].get(category, {}).get("extensions", {})
-                group_folder = "Other Types"
-                
-                if isinstance(file_groups, dict):
-                    for group_name, exts in file_groups.items():
-                        if ext in exts:
-                            group_folder = group_name
-                            break
-                        
-                dest_dir = dest_dir / group_folder
-
-            dest = safe_move(filepath, dest_dir)
-            if dest:
-                print(f"  📄 {filepath.name}  →  [{category}] {dest}")
+            if st is None:
+                st = os.stat(filepath)
+            category, dest_dir = classify(filepath, st, get_compiled(config), custom_target)
+            dest = safe_move(filepath, dest_dir, st)
+            if dest and dest != filepath:
+                _print(f"  📄 {filepath.name}  →  [{category}] {dest}")
                 return 1
             return 0
         else:
-            cat, dest = sort_file(filepath, config, base_dir=base_dir)
-            if dest:
-                print(f"  📄 {filepath.name}  →  [{cat}] {dest}")
+            cat, dest = sort_file(filepath, config, base_dir=base_dir, st=st)
+            if dest and dest != filepath:
+                _print(f"  📄 {filepath.name}  →  [{cat}] {dest}")
                 return 1
             return 0
     except Exception as exc:
-        print(f"  ⚠  Failed to move {filepath.name}: {exc}")
+        _print(f"  ⚠  Failed to move {filepath.name}: {exc}")
+        return 0
+
+
+def _resort_file(entry: os.DirEntry, config: dict) -> int:
+    f = Path(entry.path)
+    try:
+        cat, dest = sort_file(f, config, st=_entry_stat(entry))
+        if dest and dest.parent != f.parent:
+            _print(f"  🔄 {f.name}  →  [{cat}] {dest}")
+            return 1
+        return 0
+    except Exception as exc:
+        _print(f"  ⚠  Failed to re-sort {f.name}: {exc}")
         return 0
 
 
@@ -242,7 +300,7 @@ def sync_sort(config: dict) -> None:
     print("║         SORTIFY — Sync / Re-Sort             ║")
     print("╚══════════════════════════════════════════════╝\n")
 
-    all_files: list[Path] = []
+    file_dirs: list[Path] = []
     folders_to_sort: list[Path] = []
 
     for cat, rules in routing.items():
@@ -257,27 +315,28 @@ def sync_sort(config: dict) -> None:
                 if item.is_dir():
                     folders_to_sort.append(item)
         else:
-            for f in _collect_all_files(cat_path):
-                all_files.append(f)
+            file_dirs.append(cat_path)
 
-    total_items = len(all_files) + len(folders_to_sort)
-    if total_items == 0:
-        print("  No items found in any routing destination. Nothing to sync.\n")
-        return
+    print(f"  ⏳  Scanning {len(file_dirs)} destination(s) and {len(folders_to_sort)} folder(s)…\n")
 
-    print(f"  Found {len(all_files)} file(s) and {len(folders_to_sort)} folder(s) across all destinations.\n")
+    # Files are streamed straight from the scan into the pool, so moving starts
+    # before the walk finishes. A file that lands in a folder not yet scanned is
+    # seen again, but it is already at its destination and stays put. That also
+    # means the count below is scan entries, not distinct files.
+    entries_scanned = 0
 
-    moved = 0
+    def _scan() -> Iterator[os.DirEntry]:
+        nonlocal entries_scanned
+        for entry in itertools.chain.from_iterable(map(_iter_files, file_dirs)):
+            entries_scanned += 1
+            yield entry
 
     # Re-sort individual files (non-Folders categories)
-    for f in all_files:
-        try:
-            cat, dest = sort_file(f, config)
-            if dest and dest.parent != f.parent:
-                print(f"  🔄 {f.name}  →  [{cat}] {dest}")
-                moved += 1
-        except Exception as exc:
-            print(f"  ⚠  Failed to re-sort {f.name}: {exc}")
+    moved = _run_parallel(lambda f: _resort_file(f, config), _scan())
+
+    if entries_scanned + len(folders_to_sort) == 0:
+        print("  No items found in any routing destination. Nothing to sync.\n")
+        return
 
     # Re-sort intact folders (Folders category)
     for folder in folders_to_sort:
@@ -294,7 +353,8 @@ def sync_sort(config: dict) -> None:
         if cat_path.is_dir():
             _remove_empty_dirs(cat_path)
 
-    print(f"\n  ✅  Sync complete! {moved} item(s) re-routed.\n")
+    print(f"\n  ✅  Sync complete! {moved} item(s) re-routed "
+          f"({entries_scanned} file entries scanned, {len(folders_to_sort)} folder(s) checked).\n")
     input("  Press Enter to exit...")
 
 
@@ -305,16 +365,17 @@ def quick_sort(target_dir: Path, config: dict) -> None:
     print(f"\n  Target directory: {target_dir}\n")
     print("  ⏳  Processing…\n")
 
-    entries = sorted(target_dir.iterdir())
     moved = 0
 
-    for entry in entries:
-        if entry.is_file():
-            moved += _sort_single_file(entry, config, custom_target=target_dir, base_dir=target_dir)
-        elif entry.is_dir():
+    for dir_entry in _list_dir(target_dir):
+        entry = Path(dir_entry.path)
+        if dir_entry.is_file():
+            moved += _sort_single_file(entry, config, custom_target=target_dir, base_dir=target_dir,
+                                       st=_entry_stat(dir_entry))
+        elif dir_entry.is_dir():
             dest_dir = target_dir / "Folders"
             dest = safe_move(entry, dest_dir)
-            if dest:
+            if dest and dest != entry:
                 print(f"  📁 {entry.name}  →  [Folders] {dest}")
                 moved += 1
 
@@ -329,13 +390,14 @@ def sync_this_sort(target_dir: Path, config: dict) -> None:
     print(f"\n  Target directory: {target_dir}\n")
     print("  ⏳  Processing…\n")
 
-    entries = sorted(target_dir.iterdir())
     moved = 0
 
-    for entry in entries:
-        if entry.is_file():
-            moved += _sort_single_file(entry, config, custom_target=target_dir, base_dir=target_dir)
-        elif entry.is_dir():
+    for dir_entry in _list_dir(target_dir):
+        entry = Path(dir_entry.path)
+        if dir_entry.is_file():
+            moved += _sort_single_file(entry, config, custom_target=target_dir, base_dir=target_dir,
+                                       st=_entry_stat(dir_entry))
+        elif dir_entry.is_dir():
             if _is_folders_category(entry.name):
                 # Smart Flatten: collapse year subfolders, sort each original folder
                 _collapse_year_subfolders(entry)
@@ -343,7 +405,7 @@ def sync_this_sort(target_dir: Path, config: dict) -> None:
                     if item.is_dir():
                         dest_dir = target_dir / "Folders"
                         dest = safe_move(item, dest_dir)
-                        if dest:
+                        if dest and dest != item:
                             print(f"  📁 {item.name}  →  [Folders] {dest}")
                             moved += 1
                     elif item.is_file():
@@ -358,7 +420,7 @@ def sync_this_sort(target_dir: Path, config: dict) -> None:
             else:
                 dest_dir = target_dir / "Folders"
                 dest = safe_move(entry, dest_dir)
-                if dest:
+                if dest and dest != entry:
                     print(f"  📁 {entry.name}  →  [Folders] {dest}")
                     moved += 1
 
@@ -383,7 +445,7 @@ def flat_sort(target_dir: Path) -> None:
             _collapse_year_subfolders(entry)
             for item in list(entry.iterdir()):
                 dest = safe_move(item, target_dir)
-                if dest:
+                if dest and dest != item:
                     if item.is_dir():
                         print(f"  📁 {item.name}  ←  extracted from {entry.name}/")
                     else:
@@ -398,9 +460,10 @@ def flat_sort(target_dir: Path) -> None:
                 pass
         else:
             # Regular flatten: extract all files from subfolders
-            for f in _collect_all_files(entry):
+            for file_entry in _collect_all_files(entry):
+                f = Path(file_entry.path)
                 dest = safe_move(f, target_dir)
-                if dest:
+                if dest and dest != f:
                     print(f"  📄 {f.name}  ←  extracted from {entry.name}/")
                     moved += 1
             _remove_empty_dirs(entry)
@@ -1,4 +1,9 @@
 import argparse
+import ctypes
+import os
+import queue
+import stat
+import threading
 import time
 import sys
 from pathlib import Path
@@ -6,46 +11,172 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler, FileCreatedEvent, FileMovedEvent
+from watchdog.events import FileSystemEventHandler, FileClosedEvent, FileCreatedEvent, FileMovedEvent
+
+if sys.platform.startswith("linux"):
+    from watchdog.observers.inotify import InotifyObserver
+else:
+    InotifyObserver = None
 
 from engine import load_config, sort_file
 
+# A file is sorted once no new events arrived for this long and its size and
+# mtime did not change between two consecutive checks.
+DEBOUNCE_SECONDS = 0.5
 
-def _notify(title: str, message: str) -> None:
-    try:
-        from plyer import notification
+
+# Bulk drops would otherwise raise one desktop notification per file.
+NOTIFY_MIN_INTERVAL = 0.25
+
+
+def _bind_libnotify():
+    lib = ctypes.CDLL("libnotify.so.4")
+    gobject = ctypes.CDLL("libgobject-2.0.so.0")
+
+    lib.notify_init.argtypes = [ctypes.c_char_p]
+    lib.notify_init.restype = ctypes.c_bool
+    lib.notify_notification_new.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_char_p]
+    lib.notify_notification_new.restype = ctypes.c_void_p
+    lib.notify_notification_set_timeout.argtypes = [ctypes.c_void_p, ctypes.c_int]
+    lib.notify_notification_show.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
+    lib.notify_notification_show.restype = ctypes.c_bool
+    gobject.g_object_unref.argtypes = [ctypes.c_void_p]
+
+    if not lib.notify_init(b"Sortify Auto"):
+        raise OSError("notify_init failed")
+
+    def notify(title: str, message: str) -> None:
+        n = lib.notify_notification_new(title.encode(), message.encode(), None)
+        if not n:
+            return
+        lib.notify_notification_set_timeout(n, 5000)
+        lib.notify_notification_show(n, None)
+        gobject.g_object_unref(n)
+
+    return notify
+
+
+def _bind_plyer():
+    from plyer import notification
+
+    def notify(title: str, message: str) -> None:
         notification.notify(
             title=title,
             message=message,
             app_name="Sortify Auto",
             timeout=5,
         )
+
+    return notify
+
+
+def _bind_notifier():
+    binders = [_bind_libnotify, _bind_plyer] if sys.platform.startswith("linux") else [_bind_plyer]
+    for bind in binders:
+        try:
+            return bind()
+        except Exception:
+            continue
+    return None
+
+
+_notify_impl = _bind_notifier()
+_last_notify = 0.0
+
+
+def _notify(title: str, message: str) -> None:
+    global _last_notify
+    if _notify_impl is None:
+        return
+    now = time.monotonic()
+    if now - _last_notify < NOTIFY_MIN_INTERVAL:
+        return
+    _last_notify = now
+    try:
+        _notify_impl(title, message)
     except Exception:
         pass
 
 
+def _stat_file(p: Path) -> os.stat_result | None:
+    try:
+        st = os.stat(p)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return st
+
+
 class SortingHandler(FileSystemEventHandler):
 
-    def __init__(self, config: dict) -> None:
+    def __init__(self, config: dict, close_events: bool = False) -> None:
         super().__init__()
         self.config = config
+        # With inotify, IN_CLOSE_WRITE tells us exactly when a writer is done,
+        # so a close sorts the file straight away. Created files are still
+        # debounced: files moved in from an unwatched folder or hard-linked
+        # arrive as a create with no close after it.
+        self.close_events = close_events
+        self._queue: queue.Queue[tuple[str, bool] | None] = queue.Queue()
+        self._worker = threading.Thread(target=self._drain, name="sortify-worker", daemon=True)
+        self._worker.start()
 
-    def _process(self, filepath: str) -> None:
-        p = Path(filepath)
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._worker.join()
 
-        if not p.is_file():
-            return
-        if p.name.startswith(".") or p.name.startswith("~"):
+    def _process(self, filepath: str, ready: bool = False) -> None:
+        name = Path(filepath).name
+        if name.startswith(".") or name.startswith("~"):
             return
+        self._queue.put((filepath, ready))
 
-        time.sleep(1)
+    def _drain(self) -> None:
+        # path -> (time of last event, size/mtime seen on the previous tick)
+        pending: dict[str, tuple[float, tuple[int, int] | None]] = {}
 
-        if not p.exists():
-            return
+        while True:
+            try:
+                item = self._queue.get(timeout=DEBOUNCE_SECONDS if pending else None)
+                while True:
+                    if item is None:
+                        return
+                    filepath, ready = item
+                    if ready:
+                        pending.pop(filepath, None)
+                        p = Path(filepath)
+                        st = _stat_file(p)
+                        if st is not None:
+                            self._sort(p, st)
+                    else:
+                        pending[filepath] = (time.monotonic(), None)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for filepath, (last_event, last_sig) in list(pending.items()):
+                if now - last_event < DEBOUNCE_SECONDS:
+                    continue
+                p = Path(filepath)
+                st = _stat_file(p)
+                if st is None:
+                    del pending[filepath]
+                    continue
+                sig = (st.st_size, st.st_mtime_ns)
+                if sig == last_sig:
+                    del pending[filepath]
+                    self._sort(p, st)
+                else:
+                    pending[filepath] = (now, sig)
 
+    def _sort(self, p: Path, st: os.stat_result) -> None:
+        # The stat from the readiness check is reused so sort_file does not
+        # stat the file again
         try:
-            category, dest = sort_file(p, self.config)
-            if dest:
+            category, dest = sort_file(p, self.config, st=st)
+            if dest and dest != p:
                 msg = f"{p.name}  →  [{category}]"
                 print(f"  📄 {msg}  ({dest})")
                 _notify("Sortify — File Sorted", msg)
@@ -56,11 +187,23 @@ class SortingHandler(FileSystemEventHandler):
         if isinstance(event, FileCreatedEvent):
             self._process(event.src_path)
 
+    def on_closed(self, event) -> None:
+        if isinstance(event, FileClosedEvent):
+            self._process(event.src_path, ready=True)
+
     def on_moved(self, event) -> None:
         if isinstance(event, FileMovedEvent):
             self._process(event.dest_path)
 
 
+def _schedule(observer, handler: SortingHandler, path: str, event_filter: list) -> None:
+    try:
+        observer.schedule(handler, path, recursive=False, event_filter=event_filter)
+    except TypeError:
+        # watchdog < 4.0 has no event_filter and watches with the full mask
+        observer.schedule(handler, path, recursive=False)
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Sortify — Background file monitor",
@@ -79,8 +222,21 @@ def main() -> None:
         print("  ❌  No monitored_sources defined in config.json.")
         sys.exit(1)
 
-    handler = SortingHandler(config)
     observer = Observer()
+    handler = SortingHandler(
+        config,
+        close_events=InotifyObserver is not None and isinstance(observer, InotifyObserver),
+    )
+
+    # Only subscribe to the events the handler acts on. With inotify this also
+    # narrows the kernel watch mask, so IN_ACCESS/IN_OPEN/IN_MODIFY noise is
+    # never delivered to the observer thread. Created events stay in: files
+    # moved in from elsewhere arrive as one. On watchdog 4.x FileClosedEvent
+    # maps to IN_CLOSE, so read-only closes still wake the observer there;
+    # watchdog 5.0+ maps it to IN_CLOSE_WRITE only.
+    event_filter = [FileCreatedEvent, FileMovedEvent]
+    if handler.close_events:
+        event_filter.append(FileClosedEvent)
 
     print("\n╔══════════════════════════════════════════════╗")
     print("║      SORTIFY — Background File Monitor       ║")
@@ -91,7 +247,7 @@ def main() -> None:
         if not src_path.is_dir():
             print(f"  ⚠  Skipping (not found): {src}")
             continue
-        observer.schedule(handler, str(src_path), recursive=False)
+        _schedule(observer, handler, str(src_path), event_filter)
         print(f"  👁  Watching: {src_path}")
 
     print("\n  Press Ctrl+C to stop.\n")
@@ -104,6 +260,7 @@ def main() -> None:
         print("\n  🛑  Stopping watcher…")
         observer.stop()
     observer.join()
+    handler.stop()
     print("  ✅  Watcher stopped.\n")
 
 